@@ -1,11 +1,16 @@
+import hashlib
+import secrets
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from models import TokenData, User
-from storage import JSONStorage
+from storage import storage
 
 # Security configuration
 SECRET_KEY = "your-secret-key-here"  # In production, use a proper secret key
@@ -14,10 +19,33 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-storage = JSONStorage()
+
+# Результаты проверки bcrypt кешируются ненадолго, чтобы повторные входы
+# с тем же паролем не пересчитывали хеш. Ключ включает хеш из хранилища,
+# поэтому после смены пароля старые записи не используются. Пароль в ключе
+# хешируется со случайным ключом процесса, чтобы содержимое кеша нельзя было
+# перебрать офлайн.
+PASSWORD_CACHE_TTL_SECONDS = 60
+_PASSWORD_CACHE_KEY = secrets.token_bytes(32)
+_password_cache = TTLCache(maxsize=10_000, ttl=PASSWORD_CACHE_TTL_SECONDS)
+_password_cache_lock = threading.Lock()
+
+# Пользователь, найденный по токену, кешируется по строке токена, чтобы не
+# декодировать JWT и не искать пользователя на каждом запросе.
+# Запись не используется после истечения срока самого токена.
+TOKEN_CACHE_TTL_SECONDS = min(ACCESS_TOKEN_EXPIRE_MINUTES * 60, 300)
+_token_cache = TTLCache(maxsize=5000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    key = (hashed_password, hashlib.blake2b(plain_password.encode(), key=_PASSWORD_CACHE_KEY, digest_size=16).digest())
+    with _password_cache_lock:
+        verified = _password_cache.get(key)
+    if verified is None:
+        verified = pwd_context.verify(plain_password, hashed_password)
+        with _password_cache_lock:
+            _password_cache[key] = verified
+    return verified
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -32,7 +60,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at > time.time():
+            return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,13 +82,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credentials_exception
     
-    users = storage.get_users()
-    user = next((user for user in users if user["email"] == token_data.email), None)
+    user = storage.get_user_by_email(token_data.email)
     if user is None:
         raise credentials_exception
-    return User(**user)
+    user = User(**user)
+    with _token_cache_lock:
+        _token_cache[token] = (user, payload.get("exp", 0))
+    return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user 
\ No newline at end of file
@@ -1,11 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from datetime import timedelta
-from typing import List
+from typing import Iterator, List
 import uuid
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 import logging
 
 from models import User, UserCreate, Project, ProjectCreate, Task, TaskCreate, Token
@@ -16,13 +17,22 @@ from auth import (
     verify_password,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
-from storage import JSONStorage
+from storage import StorageSnapshot, storage
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Teamly API")
+# Допустимые статусы задачи и сообщение об ошибке собираются один раз
+_STATUS_ORDER = ["todo", "in_progress", "done"]
+_VALID_STATUSES = frozenset(_STATUS_ORDER)
+_INVALID_STATUS_DETAIL = f"Status must be one of {_STATUS_ORDER}"
+
+# Списки проверяются и сериализуются в JSON целиком на стороне pydantic-core
+_projects_adapter = TypeAdapter(List[Project])
+_tasks_adapter = TypeAdapter(List[Task])
+
+app = FastAPI(title="Teamly API", default_response_class=ORJSONResponse)
 
 # Настройка CORS
 origins = [
@@ -44,40 +54,42 @@ app.add_middleware(
     max_age=3600,
 )
 
-storage = JSONStorage()
+def storage_snapshot() -> Iterator[StorageSnapshot]:
+    # Один снимок данных на запрос: все чтения внутри обработчика идут через него
+    with storage.snapshot() as snapshot:
+        yield snapshot
 
 class LoginRequest(BaseModel):
     username: str
     password: str
 
 @app.post("/register", response_model=User)
-async def register(user: UserCreate):
-    users = storage.get_users()
-    if any(u["email"] == user.email for u in users):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+def register(user: UserCreate, snapshot: StorageSnapshot = Depends(storage_snapshot)):
+    email_taken_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered",
+    )
+    # Быстрая проверка по индексу, чтобы не считать bcrypt для занятого email
+    if snapshot.get_user_by_email(user.email):
+        raise email_taken_exception
     
     hashed_password = get_password_hash(user.password)
     user_dict = {
-        "id": str(uuid.uuid4()),
+        "id": uuid.uuid4().hex,
         "email": user.email,
         "name": user.name,
-        "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "created_at": datetime.utcnow(),
         "hashed_password": hashed_password,
     }
-    storage.save_user(user_dict)
+    if not storage.save_new_user(user_dict):
+        raise email_taken_exception
     return User(**{k: v for k, v in user_dict.items() if k != "hashed_password"})
 
 @app.post("/token", response_model=Token)
-async def login(login_data: LoginRequest):
+def login(login_data: LoginRequest, snapshot: StorageSnapshot = Depends(storage_snapshot)):
     logger.info(f"Login attempt for user: {login_data.username}")
     
-    users = storage.get_users()
-    logger.info(f"Total users in storage: {len(users)}")
-    
-    user = next((u for u in users if u["email"] == login_data.username), None)
+    user = snapshot.get_user_by_email(login_data.username)
     if not user:
         logger.warning(f"User not found: {login_data.username}")
         raise HTTPException(
@@ -106,16 +118,16 @@ async def login(login_data: LoginRequest):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me", response_model=User)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 @app.post("/projects", response_model=Project)
-async def create_project(
+def create_project(
     project: ProjectCreate,
     current_user: User = Depends(get_current_active_user)
 ):
     project_dict = {
-        "id": str(uuid.uuid4()),
+        "id": uuid.uuid4().hex,
         "name": project.name,
         "description": project.description,
         "owner_id": current_user.id,
@@ -125,27 +137,30 @@ async def create_project(
     storage.save_project(project_dict)
     return Project(**project_dict)
 
-@app.get("/projects", response_model=List[Project])
-async def get_projects(current_user: User = Depends(get_current_active_user)):
-    projects = storage.get_projects()
-    return [Project(**p) for p in projects if current_user.id in p["members"]]
+@app.get("/projects", response_model=None, responses={200: {"model": List[Project]}})
+def get_projects(
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
+):
+    projects = _projects_adapter.validate_python(snapshot.get_projects_by_member(current_user.id))
+    return Response(content=_projects_adapter.dump_json(projects), media_type="application/json")
 
 @app.post("/tasks", response_model=Task)
-async def create_task(
+def create_task(
     task: TaskCreate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
     # Verify project exists and user has access
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == task.project_id), None)
-    if not project or current_user.id not in project["members"]:
+    project = snapshot.get_project(task.project_id)
+    if not project or not snapshot.is_project_member(project["id"], current_user.id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found or access denied",
         )
     
     task_dict = {
-        "id": str(uuid.uuid4()),
+        "id": uuid.uuid4().hex,
         "title": task.title,
         "description": task.description,
         "project_id": task.project_id,
@@ -155,21 +170,16 @@ async def create_task(
     storage.save_task(task_dict)
     return Task(**task_dict)
 
-@app.get("/tasks", response_model=List[Task])
-async def get_tasks(current_user: User = Depends(get_current_active_user)):
-    projects = storage.get_projects()
-    user_projects = [p["id"] for p in projects if current_user.id in p["members"]]
-    tasks = storage.get_tasks()
-    return [Task(**t) for t in tasks if t["project_id"] in user_projects]
-
-@app.put("/tasks/{task_id}/assign")
-async def assign_task(
-    task_id: str,
-    assignee_id: str,
-    current_user: User = Depends(get_current_active_user)
+@app.get("/tasks", response_model=None, responses={200: {"model": List[Task]}})
+def get_tasks(
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
-    tasks = storage.get_tasks()
-    task = next((t for t in tasks if t["id"] == task_id), None)
+    tasks = _tasks_adapter.validate_python(snapshot.get_tasks_by_member(current_user.id))
+    return Response(content=_tasks_adapter.dump_json(tasks), media_type="application/json")
+
+def get_accessible_task(task_id: str, current_user: User, snapshot: StorageSnapshot) -> dict:
+    task = snapshot.get_task(task_id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -177,68 +187,59 @@ async def assign_task(
         )
     
     # Verify project access
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == task["project_id"]), None)
-    if not project or current_user.id not in project["members"]:
+    if not snapshot.is_project_member(task["project_id"], current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied",
         )
+    return task
+
+@app.put("/tasks/{task_id}/assign")
+def assign_task(
+    task_id: str,
+    assignee_id: str,
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
+):
+    task = get_accessible_task(task_id, current_user, snapshot)
     
     # Verify assignee is a project member
-    if assignee_id not in project["members"]:
+    if not snapshot.is_project_member(task["project_id"], assignee_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Assignee must be a project member",
         )
     
-    task["assignee_id"] = assignee_id
-    storage.update_task(task_id, task)
-    return Task(**task)
+    updated_task = storage.update_task(task_id, {"assignee_id": assignee_id})
+    return Task(**updated_task)
 
 @app.put("/tasks/{task_id}/status")
-async def update_task_status(
+def update_task_status(
     task_id: str,
-    status: str,
-    current_user: User = Depends(get_current_active_user)
+    new_status: str = Query(alias="status"),
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
-    tasks = storage.get_tasks()
-    task = next((t for t in tasks if t["id"] == task_id), None)
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found",
-        )
-    
-    # Verify project access
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == task["project_id"]), None)
-    if not project or current_user.id not in project["members"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied",
-        )
+    task = get_accessible_task(task_id, current_user, snapshot)
     
-    valid_statuses = ["todo", "in_progress", "done"]
-    if status not in valid_statuses:
+    if new_status not in _VALID_STATUSES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Status must be one of {valid_statuses}",
+            detail=_INVALID_STATUS_DETAIL,
         )
     
-    task["status"] = status
-    storage.update_task(task_id, task)
-    return Task(**task)
+    updated_task = storage.update_task(task_id, {"status": new_status})
+    return Task(**updated_task)
 
 @app.put("/projects/{project_id}", response_model=Project)
-async def update_project(
+def update_project(
     project_id: str,
     project_data: ProjectCreate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
     # Получаем проект
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == project_id), None)
+    project = snapshot.get_project(project_id)
     
     if not project:
         raise HTTPException(
@@ -254,58 +255,37 @@ async def update_project(
         )
     
     # Обновляем данные проекта
-    updated_project = {
-        **project,
+    updated_project = storage.update_project(project_id, {
         "name": project_data.name,
         "description": project_data.description,
-    }
-    
-    storage.update_project(project_id, updated_project)
+    })
     return Project(**updated_project)
 
 @app.put("/tasks/{task_id}", response_model=Task)
-async def update_task(
+def update_task(
     task_id: str,
     task_data: TaskCreate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
-    # Получаем задачу
-    tasks = storage.get_tasks()
-    task = next((t for t in tasks if t["id"] == task_id), None)
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found",
-        )
-    
-    # Проверяем доступ к проекту
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == task["project_id"]), None)
-    if not project or current_user.id not in project["members"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied",
-        )
+    # Получаем задачу и проверяем доступ к проекту
+    task = get_accessible_task(task_id, current_user, snapshot)
     
     # Обновляем данные задачи
-    updated_task = {
-        **task,
+    updated_task = storage.update_task(task_id, {
         "title": task_data.title,
         "description": task_data.description,
-    }
-    
-    storage.update_task(task_id, updated_task)
+    })
     return Task(**updated_task)
 
 @app.get("/projects/{project_id}", response_model=Project)
-async def get_project(
+def get_project(
     project_id: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    snapshot: StorageSnapshot = Depends(storage_snapshot),
 ):
     # Получаем проект
-    projects = storage.get_projects()
-    project = next((p for p in projects if p["id"] == project_id), None)
+    project = snapshot.get_project(project_id)
     
     if not project:
         raise HTTPException(
@@ -314,7 +294,7 @@ async def get_project(
         )
     
     # Проверяем, является ли пользователь участником проекта
-    if current_user.id not in project["members"]:
+    if not snapshot.is_project_member(project_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied",
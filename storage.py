@@ -1,86 +1,307 @@
-import json
-import os
-from typing import Dict, List, Any
-from pathlib import Path
+import logging
+import orjson
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    hashed_password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS project_members (
+    project_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (project_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS project_members_user_id ON project_members (user_id);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL,
+    assignee_id TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_project_id ON tasks (project_id);
+"""
+
+# Версия данных в PRAGMA user_version: выставляется в той же транзакции,
+# что и перенос старых JSON-файлов, поэтому прерванный перенос повторится
+MIGRATED_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+# Колонки таблиц; участники проекта хранятся отдельно в project_members
+USER_COLUMNS = ("id", "email", "name", "created_at", "hashed_password")
+PROJECT_COLUMNS = ("id", "owner_id", "name", "description", "created_at")
+TASK_COLUMNS = ("id", "project_id", "title", "description", "status", "assignee_id", "created_at")
+
+def _to_db(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+class StorageSnapshot:
+    """Согласованное представление данных для чтения на время одного запроса.
+
+    Все чтения идут внутри одной транзакции: в режиме WAL она видит базу
+    такой, какой та была в начале транзакции, и не блокирует запись.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def _project_with_members(self, row: sqlite3.Row) -> Dict:
+        members = self._conn.execute(
+            "SELECT user_id FROM project_members WHERE project_id = ? ORDER BY user_id",
+            (row["id"],),
+        ).fetchall()
+        return {**dict(row), "members": [m["user_id"] for m in members]}
 
-class JSONStorage:
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        row = self._conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def get_project(self, project_id: str) -> Optional[Dict]:
+        row = self._conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return self._project_with_members(row) if row else None
+
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_tasks_by_project(self, project_id: str) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT * FROM tasks WHERE project_id = ? ORDER BY rowid", (project_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_projects_by_member(self, user_id: str) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT p.* FROM projects p JOIN project_members m ON m.project_id = p.id "
+            "WHERE m.user_id = ? ORDER BY p.rowid",
+            (user_id,),
+        ).fetchall()
+        members = self._conn.execute(
+            "SELECT project_id, user_id FROM project_members WHERE project_id IN "
+            "(SELECT project_id FROM project_members WHERE user_id = ?) ORDER BY user_id",
+            (user_id,),
+        ).fetchall()
+        members_by_project: Dict[str, List[str]] = {}
+        for m in members:
+            members_by_project.setdefault(m["project_id"], []).append(m["user_id"])
+        return [{**dict(row), "members": members_by_project.get(row["id"], [])} for row in rows]
+
+    def get_tasks_by_member(self, user_id: str) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT t.* FROM tasks t JOIN project_members m ON m.project_id = t.project_id "
+            "WHERE m.user_id = ? ORDER BY t.rowid",
+            (user_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_project_member(self, project_id: str, user_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM project_members WHERE project_id = ? AND user_id = ?",
+            (project_id, user_id),
+        ).fetchone()
+        return row is not None
+
+class SQLiteStorage:
     def __init__(self, storage_dir: str = "data"):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
-        self.users_file = self.storage_dir / "users.json"
-        self.projects_file = self.storage_dir / "projects.json"
-        self.tasks_file = self.storage_dir / "tasks.json"
-        
-        # Initialize files if they don't exist
-        for file in [self.users_file, self.projects_file, self.tasks_file]:
-            if not file.exists():
-                with open(file, "w") as f:
-                    json.dump([], f)
-    
-    def _serialize_datetime(self, obj: Any) -> Any:
-        if isinstance(obj, datetime):
-            return obj.strftime("%Y-%m-%d %H:%M:%S")
-        return obj
-    
-    def _read_file(self, file_path: Path) -> List[Dict]:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    
-    def _write_file(self, file_path: Path, data: List[Dict]):
-        # Сериализуем все объекты datetime в строки
-        serialized_data = []
-        for item in data:
-            serialized_item = {k: self._serialize_datetime(v) for k, v in item.items()}
-            serialized_data.append(serialized_item)
-        
-        with open(file_path, "w") as f:
-            json.dump(serialized_data, f, indent=2)
-    
-    def get_users(self) -> List[Dict]:
-        return self._read_file(self.users_file)
-    
-    def get_projects(self) -> List[Dict]:
-        return self._read_file(self.projects_file)
-    
-    def get_tasks(self) -> List[Dict]:
-        return self._read_file(self.tasks_file)
-    
+        self.db_file = self.storage_dir / "teamly.db"
+
+        # Запись идёт через одно соединение под блокировкой,
+        # чтение — через пул соединений, которые в режиме WAL не мешают записи
+        self._write_lock = threading.RLock()
+        self._write_conn = self._connect()
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.executescript(SCHEMA)
+        self._read_pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+
+        self._migrate_json()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: транзакции открываем явно
+        conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            self._write_conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._write_conn
+                self._write_conn.execute("COMMIT")
+            except BaseException:
+                # COMMIT тоже может упасть (SQLITE_BUSY, нет места на диске) —
+                # нельзя оставлять общее соединение внутри открытой транзакции
+                if self._write_conn.in_transaction:
+                    self._write_conn.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def snapshot(self) -> Iterator[StorageSnapshot]:
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            yield StorageSnapshot(conn)
+        finally:
+            conn.execute("COMMIT")
+            self._read_pool.put(conn)
+
+    def _migrate_json(self):
+        # Переносим данные из прежнего JSON-хранилища (*.jsonl или *.json), если оно было
+        def load(name: str) -> List[Dict]:
+            jsonl_file = self.storage_dir / f"{name}.jsonl"
+            json_file = self.storage_dir / f"{name}.json"
+            if jsonl_file.exists():
+                lines = [line for line in jsonl_file.read_bytes().splitlines() if line.strip()]
+                items = [orjson.loads(line) for line in lines[:-1]]
+                if lines:
+                    # Последняя строка может быть оборвана, если процесс упал во время дописывания
+                    try:
+                        items.append(orjson.loads(lines[-1]))
+                    except orjson.JSONDecodeError:
+                        logger.warning("Skipping truncated last line in %s", jsonl_file)
+                return items
+            if json_file.exists():
+                return orjson.loads(json_file.read_bytes())
+            return []
+
+        with self._transaction() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= MIGRATED_VERSION:
+                return
+            # Записи с уже занятым id или email пропускаются: остаётся первая
+            for user in load("users"):
+                if not self._insert(conn, "users", USER_COLUMNS, user, or_ignore=True):
+                    logger.warning("Skipping legacy user %s: duplicate id or email", user.get("email"))
+            for project in load("projects"):
+                if self._insert(conn, "projects", PROJECT_COLUMNS, project, or_ignore=True):
+                    self._set_members(conn, project["id"], project.get("members", []))
+                else:
+                    logger.warning("Skipping legacy project %s: duplicate id", project.get("id"))
+            for task in load("tasks"):
+                if not self._insert(conn, "tasks", TASK_COLUMNS, {"status": "todo", **task}, or_ignore=True):
+                    logger.warning("Skipping legacy task %s: duplicate id", task.get("id"))
+            conn.execute(f"PRAGMA user_version = {MIGRATED_VERSION}")
+
+    def _insert(self, conn: sqlite3.Connection, table: str, columns: tuple, item: Dict, or_ignore: bool = False) -> bool:
+        cursor = conn.execute(
+            f"INSERT {'OR IGNORE ' if or_ignore else ''}INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [_to_db(item.get(column)) for column in columns],
+        )
+        return cursor.rowcount > 0
+
+    def _set_members(self, conn: sqlite3.Connection, project_id: str, members: List[str]):
+        conn.execute("DELETE FROM project_members WHERE project_id = ?", (project_id,))
+        conn.executemany(
+            "INSERT INTO project_members (project_id, user_id) VALUES (?, ?)",
+            [(project_id, user_id) for user_id in set(members)],
+        )
+
+    def _insert_project(self, conn: sqlite3.Connection, project: Dict):
+        self._insert(conn, "projects", PROJECT_COLUMNS, project)
+        self._set_members(conn, project["id"], project.get("members", []))
+
+    def _update(self, conn: sqlite3.Connection, table: str, columns: tuple, item_id: str, item_data: Dict) -> bool:
+        fields = [column for column in columns if column in item_data and column != "id"]
+        if not fields:
+            return conn.execute(f"SELECT 1 FROM {table} WHERE id = ?", (item_id,)).fetchone() is not None
+        cursor = conn.execute(
+            f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in fields)} WHERE id = ?",
+            [_to_db(item_data[column]) for column in fields] + [item_id],
+        )
+        return cursor.rowcount > 0
+
+    def get_user_by_email(self, email: str) -> Optional[Dict]:
+        with self.snapshot() as snapshot:
+            return snapshot.get_user_by_email(email)
+
+    def get_project(self, project_id: str) -> Optional[Dict]:
+        with self.snapshot() as snapshot:
+            return snapshot.get_project(project_id)
+
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        with self.snapshot() as snapshot:
+            return snapshot.get_task(task_id)
+
+    def get_tasks_by_project(self, project_id: str) -> List[Dict]:
+        with self.snapshot() as snapshot:
+            return snapshot.get_tasks_by_project(project_id)
+
+    def get_projects_by_member(self, user_id: str) -> List[Dict]:
+        with self.snapshot() as snapshot:
+            return snapshot.get_projects_by_member(user_id)
+
+    def is_project_member(self, project_id: str, user_id: str) -> bool:
+        with self.snapshot() as snapshot:
+            return snapshot.is_project_member(project_id, user_id)
+
     def save_user(self, user: Dict):
-        users = self.get_users()
-        users.append(user)
-        self._write_file(self.users_file, users)
-    
+        with self._transaction() as conn:
+            self._insert(conn, "users", USER_COLUMNS, user)
+
+    def save_new_user(self, user: Dict) -> bool:
+        # Проверка email и вставка в одной транзакции: два одновременных
+        # запроса с одним email не могут пройти проверку оба
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM users WHERE email = ?", (user["email"],)).fetchone():
+                return False
+            self._insert(conn, "users", USER_COLUMNS, user)
+            return True
+
     def save_project(self, project: Dict):
-        projects = self.get_projects()
-        projects.append(project)
-        self._write_file(self.projects_file, projects)
-    
+        with self._transaction() as conn:
+            self._insert_project(conn, project)
+
     def save_task(self, task: Dict):
-        tasks = self.get_tasks()
-        tasks.append(task)
-        self._write_file(self.tasks_file, tasks)
-    
-    def update_user(self, user_id: str, user_data: Dict):
-        users = self.get_users()
-        for i, user in enumerate(users):
-            if user["id"] == user_id:
-                users[i] = {**user, **user_data}
-                break
-        self._write_file(self.users_file, users)
-    
-    def update_project(self, project_id: str, project_data: Dict):
-        projects = self.get_projects()
-        for i, project in enumerate(projects):
-            if project["id"] == project_id:
-                projects[i] = {**project, **project_data}
-                break
-        self._write_file(self.projects_file, projects)
-    
-    def update_task(self, task_id: str, task_data: Dict):
-        tasks = self.get_tasks()
-        for i, task in enumerate(tasks):
-            if task["id"] == task_id:
-                tasks[i] = {**task, **task_data}
-                break
-        self._write_file(self.tasks_file, tasks) 
\ No newline at end of file
+        with self._transaction() as conn:
+            self._insert(conn, "tasks", TASK_COLUMNS, task)
+
+    def update_user(self, user_id: str, user_data: Dict) -> Optional[Dict]:
+        with self._transaction() as conn:
+            if not self._update(conn, "users", USER_COLUMNS, user_id, user_data):
+                return None
+            return dict(conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone())
+
+    def update_project(self, project_id: str, project_data: Dict) -> Optional[Dict]:
+        with self._transaction() as conn:
+            if not self._update(conn, "projects", PROJECT_COLUMNS, project_id, project_data):
+                return None
+            if "members" in project_data:
+                self._set_members(conn, project_id, project_data["members"])
+            return StorageSnapshot(conn).get_project(project_id)
+
+    def update_task(self, task_id: str, task_data: Dict) -> Optional[Dict]:
+        with self._transaction() as conn:
+            if not self._update(conn, "tasks", TASK_COLUMNS, task_id, task_data):
+                return None
+            return dict(conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+
+storage = SQLiteStorage()